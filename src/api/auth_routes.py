@@ -2,10 +2,14 @@ from fastapi import APIRouter, HTTPException, status
 from datetime import timedelta
 from ..models.schemas import UserLogin, Token, User
 from ..services.auth import simple_auth_login, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from ..db.supabase_mcp_client import supabase_mcp_client as supabase_client
+from ..db.supabase_mcp_client import get_supabase_mcp_client as get_supabase_client
+from ..db.redis_client import get_redis_client
+from .responses import json_response
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
+USER_CACHE_TTL_SECONDS = 60
+
 @router.post("/login", response_model=Token)
 async def login(credentials: UserLogin):
     """
@@ -21,12 +25,9 @@ async def login(credentials: UserLogin):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Get or create user
-    user = await supabase_client.get_user(credentials.username)
-    if not user:
-        user = await supabase_client.create_user(credentials.username)
-    else:
-        await supabase_client.update_last_login(credentials.username)
+    # Create user or refresh last login in one round-trip
+    await get_supabase_client().upsert_user(credentials.username)
+    await get_redis_client().delete(f"user:{credentials.username}")
 
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -35,19 +36,27 @@ async def login(credentials: UserLogin):
         expires_delta=access_token_expires
     )
 
-    return {
+    # Built here from known fields, so skip re-validating it against Token
+    return json_response({
         "access_token": access_token,
         "token_type": "bearer",
         "username": credentials.username
-    }
+    })
 
 @router.get("/me", response_model=User)
 async def get_current_user(username: str):
     """Get current user information."""
-    user = await supabase_client.get_user(username)
+    cache_key = f"user:{username}"
+    user = await get_redis_client().get(cache_key)
+    if user:
+        return user
+
+    user = await get_supabase_client().get_user(username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+
+    await get_redis_client().set(cache_key, user, expire_seconds=USER_CACHE_TTL_SECONDS)
     return user
@@ -0,0 +1,12 @@
+from fastapi import Response
+import orjson
+from typing import Any
+
+def json_response(data: Any) -> Response:
+    """
+    Serialize with orjson and return the Response directly, so FastAPI skips
+    jsonable_encoder and re-validating data we built ourselves against response_model.
+    Only use this for trusted or already validated data; other model output
+    should go through the route's response_model.
+    """
+    return Response(content=orjson.dumps(data, default=str), media_type="application/json")
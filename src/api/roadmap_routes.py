@@ -1,26 +1,69 @@
-from fastapi import APIRouter, HTTPException, status, Header
-from typing import Optional, List
+import logging
+import asyncio
+import hashlib
+import hmac
+import os
+import orjson
+import time
+from functools import lru_cache
+from fastapi import APIRouter, HTTPException, status, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Tuple, AsyncIterator, Dict, Any
+from pydantic import TypeAdapter
 from ..models.schemas import (
     RoadmapGenerateRequest,
     RoadmapUpdateRequest,
     RoadmapResponse,
-    Roadmap
+    Roadmap,
+    SkillAssessment,
+    LearningPreferences
 )
-from ..services.scout_client import scout_client
-from ..db.supabase_mcp_client import supabase_mcp_client as supabase_client
-from ..db.redis_client import redis_client
+from ..services.scout_client import get_scout_client
+from ..db.supabase_mcp_client import get_supabase_mcp_client as get_supabase_client
+from ..db.redis_client import get_redis_client
 from ..services.auth import decode_access_token
+from .responses import json_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/roadmaps", tags=["roadmaps"])
 
+# Short-lived cache entry marking a roadmap ID that doesn't exist,
+# so repeated lookups of bad IDs don't each hit the database
+ROADMAP_MISS_SENTINEL = {"__miss__": True}
+ROADMAP_MISS_TTL_SECONDS = 30
+_ROADMAP_MISS_BYTES = orjson.dumps(ROADMAP_MISS_SENTINEL)
+
+# Shared secret internal callers send in X-Cache-Bypass-Miss; unset disables the bypass
+CACHE_BYPASS_SECRET = os.getenv("CACHE_BYPASS_SECRET", "")
+
+def _can_bypass_miss_cache(header_value: Optional[str]) -> bool:
+    return bool(CACHE_BYPASS_SECRET and header_value) and hmac.compare_digest(
+        header_value.encode(), CACHE_BYPASS_SECRET.encode()
+    )
+
+# Built once at import so serializers are compiled ahead of the first request
+_skills_adapter = TypeAdapter(List[SkillAssessment])
+_prefs_adapter = TypeAdapter(LearningPreferences)
+
+@lru_cache(maxsize=4096)
+def _decode_token_cached(token: str) -> Tuple[str, Optional[float]]:
+    """Decode a JWT once per token; returns (subject, expiry timestamp)."""
+    payload = decode_access_token(token)
+    if not payload:
+        return ("anonymous", None)
+    return (payload.get("sub", "anonymous"), payload.get("exp"))
+
 def get_username_from_token(authorization: Optional[str] = Header(None)) -> str:
     """Extract username from JWT token."""
     if not authorization or not authorization.startswith("Bearer "):
         return "anonymous"
 
-    token = authorization.replace("Bearer ", "")
-    payload = decode_access_token(token)
-    return payload.get("sub", "anonymous") if payload else "anonymous"
+    username, expires_at = _decode_token_cached(authorization[7:])
+    # Cached decodes skip JWT verification, so re-check expiry here
+    if expires_at is not None and expires_at <= time.time():
+        return "anonymous"
+    return username
 
 @router.post("/generate", response_model=RoadmapResponse)
 async def generate_roadmap(
@@ -39,64 +82,161 @@ async def generate_roadmap(
         username = get_username_from_token(authorization)
 
         # Convert Pydantic models to dicts
-        skills_dict = [skill.dict() for skill in request.current_skills]
-        preferences_dict = request.learning_preferences.dict() if request.learning_preferences else None
+        skills_dict = _skills_adapter.dump_python(request.current_skills, mode="json")
+        preferences_dict = (
+            _prefs_adapter.dump_python(request.learning_preferences, mode="json")
+            if request.learning_preferences else None
+        )
 
         # Generate roadmap using Scout
-        result = await scout_client.generate_roadmap(
+        result = await get_scout_client().generate_roadmap(
             career_goal=request.career_goal,
             current_skills=skills_dict,
             learning_preferences=preferences_dict,
             user_id=username
         )
 
-        # Save to database
+        # Save to database and cache in Redis concurrently
         roadmap_data = result["roadmap"]
-        await supabase_client.save_roadmap(roadmap_data)
-
-        # Cache in Redis for faster retrieval
         cache_key = f"roadmap:{roadmap_data['id']}"
-        redis_client.set(cache_key, roadmap_data, expire_seconds=3600)
+        await asyncio.gather(
+            get_supabase_client().save_roadmap(roadmap_data),
+            get_redis_client().set(cache_key, roadmap_data, expire_seconds=3600),
+        )
 
-        return result
+        # ScoutClient validated the generated roadmap against Roadmap
+        return json_response(result)
 
     except Exception as e:
-        print(f"Error generating roadmap: {e}")
+        logger.exception("Error generating roadmap")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate roadmap: {str(e)}"
         )
 
+ROADMAP_BATCH_MAX_IDS = 100
+
+@router.get("/batch", response_model=dict)
+async def get_roadmaps_batch(ids: str = Query(..., description="Comma-separated roadmap IDs")):
+    """
+    Get several roadmaps by ID in one request.
+    Reads all cache keys with a single MGET and only falls back
+    to the database for the misses. IDs recently found not to exist are skipped.
+    Duplicate IDs are ignored; more than ROADMAP_BATCH_MAX_IDS distinct IDs is a 400.
+    """
+    # De-duplicate (keeping order) and cap, so one request can't fan out into unbounded DB calls
+    roadmap_ids = list(dict.fromkeys(roadmap_id for roadmap_id in ids.split(",") if roadmap_id))
+    if len(roadmap_ids) > ROADMAP_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {ROADMAP_BATCH_MAX_IDS} roadmap IDs per request"
+        )
+
+    try:
+        cache_keys = [f"roadmap:{roadmap_id}" for roadmap_id in roadmap_ids]
+        cached = await get_redis_client().mget(cache_keys)
+
+        # Fetch all misses from the database concurrently
+        missing = [i for i, roadmap in enumerate(cached) if roadmap is None]
+        fetched = await asyncio.gather(
+            *(get_supabase_client().get_roadmap(roadmap_ids[i]) for i in missing),
+            return_exceptions=True
+        )
+        to_cache = {}
+        not_found = {}
+        for i, roadmap in zip(missing, fetched):
+            if isinstance(roadmap, Exception):
+                # Failed lookups are left out, but not cached as misses
+                continue
+            if roadmap:
+                cached[i] = roadmap
+                to_cache[cache_keys[i]] = roadmap
+            else:
+                not_found[cache_keys[i]] = ROADMAP_MISS_SENTINEL
+        roadmaps = [roadmap for roadmap in cached if roadmap and roadmap != ROADMAP_MISS_SENTINEL]
+
+        # Write back all misses in pipelined round-trips
+        await asyncio.gather(
+            get_redis_client().mset(to_cache, expire_seconds=3600),
+            get_redis_client().mset(not_found, expire_seconds=ROADMAP_MISS_TTL_SECONDS),
+        )
+
+        return {"roadmaps": roadmaps, "count": len(roadmaps)}
+
+    except Exception as e:
+        logger.exception("Error retrieving roadmaps")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve roadmaps: {str(e)}"
+        )
+
+ROADMAP_CACHE_CONTROL = "private, max-age=60"
+
+def _roadmap_json_response(raw_roadmap: bytes, if_none_match: Optional[str] = None) -> Response:
+    """
+    Wrap already-encoded roadmap JSON in the {"roadmap": ...} envelope.
+    Returns 304 Not Modified if the client's If-None-Match matches the ETag.
+    """
+    etag = f'"{hashlib.blake2b(raw_roadmap, digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": ROADMAP_CACHE_CONTROL}
+
+    if if_none_match:
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=b'{"roadmap":' + raw_roadmap + b'}',
+        media_type="application/json",
+        headers=headers
+    )
+
 @router.get("/{roadmap_id}", response_model=dict)
-async def get_roadmap(roadmap_id: str):
+async def get_roadmap(
+    roadmap_id: str,
+    if_none_match: Optional[str] = Header(None),
+    x_cache_bypass_miss: Optional[str] = Header(None)
+):
     """
     Get a specific roadmap by ID.
     Checks Redis cache first, then falls back to database.
+    Cached bytes are returned as-is, skipping decode and response serialization.
+    Supports conditional requests via ETag / If-None-Match.
+    Not-found IDs are cached briefly; internal callers can send
+    `X-Cache-Bypass-Miss: <CACHE_BYPASS_SECRET>` to re-check the database anyway.
     """
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Roadmap {roadmap_id} not found"
+    )
     try:
         # Check cache first
         cache_key = f"roadmap:{roadmap_id}"
-        cached_roadmap = redis_client.get(cache_key)
-        if cached_roadmap:
-            return {"roadmap": cached_roadmap}
+        cached_roadmap = await get_redis_client().get_raw(cache_key)
+        if cached_roadmap == _ROADMAP_MISS_BYTES:
+            if not _can_bypass_miss_cache(x_cache_bypass_miss):
+                raise not_found
+        elif cached_roadmap:
+            return _roadmap_json_response(cached_roadmap, if_none_match)
 
         # Fallback to database
-        roadmap = await supabase_client.get_roadmap(roadmap_id)
+        roadmap = await get_supabase_client().get_roadmap(roadmap_id)
         if not roadmap:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Roadmap {roadmap_id} not found"
+            await get_redis_client().set_raw(
+                cache_key, _ROADMAP_MISS_BYTES, expire_seconds=ROADMAP_MISS_TTL_SECONDS
             )
+            raise not_found
 
-        # Cache for next time
-        redis_client.set(cache_key, roadmap, expire_seconds=3600)
+        # Encode once for both the cache and the response
+        raw_roadmap = orjson.dumps(roadmap)
+        await get_redis_client().set_raw(cache_key, raw_roadmap, expire_seconds=3600)
 
-        return {"roadmap": roadmap}
+        return _roadmap_json_response(raw_roadmap, if_none_match)
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error retrieving roadmap: {e}")
+        logger.exception("Error retrieving roadmap")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve roadmap: {str(e)}"
@@ -113,8 +253,12 @@ async def update_roadmap(
     Scout AI will modify the roadmap according to the user's request.
     """
     try:
-        # Get existing roadmap
-        existing = await supabase_client.get_roadmap(roadmap_id)
+        # Get existing roadmap, preferring the copy cached at generation time.
+        # Skip the per-process layer: a stale copy there would undo another worker's update.
+        cache_key = f"roadmap:{roadmap_id}"
+        existing = await get_redis_client().get(cache_key, skip_l1=True)
+        if not existing or existing == ROADMAP_MISS_SENTINEL:
+            existing = await get_supabase_client().get_roadmap(roadmap_id)
         if not existing:
             # Use provided roadmap if database doesn't have it
             if not request.existing_roadmap:
@@ -122,44 +266,81 @@ async def update_roadmap(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Roadmap {roadmap_id} not found"
                 )
-            existing = request.existing_roadmap.dict()
+            existing = request.existing_roadmap.model_dump(mode="json")
 
         # Update using Scout
-        result = await scout_client.update_roadmap(
+        result = await get_scout_client().update_roadmap(
             roadmap_id=roadmap_id,
             user_prompt=request.user_prompt,
             existing_roadmap=existing
         )
 
-        # Save updated roadmap
+        # Save updated roadmap and refresh cache concurrently
         updated_roadmap = result["roadmap"]
-        await supabase_client.update_roadmap(roadmap_id, updated_roadmap)
-
-        # Update cache
-        cache_key = f"roadmap:{roadmap_id}"
-        redis_client.set(cache_key, updated_roadmap, expire_seconds=3600)
+        await asyncio.gather(
+            get_supabase_client().update_roadmap(roadmap_id, updated_roadmap),
+            get_redis_client().set(cache_key, updated_roadmap, expire_seconds=3600),
+        )
 
-        return result
+        # ScoutClient.update_roadmap validated the patched roadmap against Roadmap
+        return json_response(result)
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error updating roadmap: {e}")
+        logger.exception("Error updating roadmap")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to update roadmap: {str(e)}"
         )
 
+ROADMAP_CACHE_WARM_BATCH_SIZE = 50
+
+async def _stream_roadmaps_json(
+    first: Optional[Dict[str, Any]],
+    roadmaps: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[bytes]:
+    """
+    Encode roadmaps as {"roadmaps": [...], "count": N} while they stream in,
+    warming the per-roadmap cache keys in pipelined batches along the way.
+    `first` is the already-fetched first roadmap, or None for an empty list.
+    If the source fails partway, the error propagates and the body is left
+    unterminated, so the client can't mistake a cut-off list for a complete one.
+    """
+    yield b'{"roadmaps":['
+    count = 0
+    to_cache = {}
+    roadmap = first
+    while roadmap is not None:
+        if count:
+            yield b","
+        yield orjson.dumps(roadmap)
+        count += 1
+
+        if roadmap.get("id"):
+            to_cache[f"roadmap:{roadmap['id']}"] = roadmap
+        if len(to_cache) >= ROADMAP_CACHE_WARM_BATCH_SIZE:
+            await get_redis_client().mset(to_cache, expire_seconds=3600)
+            to_cache = {}
+        roadmap = await anext(roadmaps, None)
+
+    await get_redis_client().mset(to_cache, expire_seconds=3600)
+    yield b'],"count":%d}' % count
+
 @router.get("/user/{username}", response_model=dict)
 async def get_user_roadmaps(username: str):
-    """Get all roadmaps for a specific user."""
+    """
+    Get all roadmaps for a specific user.
+    Roadmaps are streamed to the client as they are parsed from the database response.
+    """
+    roadmaps = get_supabase_client().iter_user_roadmaps(username)
+    # Wait for the first row before committing to a 200, so upfront failures
+    # (including MCP error responses) still return a proper error status
     try:
-        roadmaps = await supabase_client.get_user_roadmaps(username)
-        return {"roadmaps": roadmaps, "count": len(roadmaps)}
-
+        first = await anext(roadmaps, None)
     except Exception as e:
-        print(f"Error retrieving user roadmaps: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve roadmaps: {str(e)}"
         )
+    return StreamingResponse(_stream_roadmaps_json(first, roadmaps), media_type="application/json")
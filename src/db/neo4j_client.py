@@ -1,6 +1,51 @@
-from neo4j import GraphDatabase
+import logging
+import re
+from itertools import islice
+from neo4j import GraphDatabase, Result
 import os
-from typing import Optional, List, Dict, Any
+from functools import cache
+from typing import Optional, List, Dict, Any, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+# Mock data for demo purposes when Neo4j isn't configured
+_MOCK_RELATED: Dict[str, Tuple[str, ...]] = {
+    "Python": ("Django", "Flask", "FastAPI", "Data Analysis", "Machine Learning"),
+    "JavaScript": ("React", "Node.js", "TypeScript", "Vue.js", "Angular"),
+    "React": ("JavaScript", "TypeScript", "Redux", "Next.js", "HTML/CSS"),
+    "Machine Learning": ("Python", "TensorFlow", "PyTorch", "Data Science", "Statistics"),
+}
+_MOCK_RELATED_DEFAULT: Tuple[str, ...] = ("Data Analysis", "Problem Solving", "Communication")
+
+_MOCK_PREREQS: Dict[str, Tuple[str, ...]] = {
+    "React": ("JavaScript", "HTML/CSS"),
+    "Django": ("Python", "Web Development Basics"),
+    "Machine Learning": ("Python", "Statistics", "Linear Algebra"),
+    "FastAPI": ("Python", "REST APIs"),
+}
+
+# (name, category, lowercased name for matching)
+_MOCK_SEARCH: Tuple[Tuple[str, str, str], ...] = tuple(
+    (name, category, name.lower())
+    for name, category in (
+        ("Python Programming", "Programming"),
+        ("JavaScript Development", "Programming"),
+        ("Machine Learning", "Data Science"),
+        ("React Development", "Web Development"),
+        ("Data Analysis", "Data Science"),
+    )
+)
+
+_LUCENE_SPECIAL_CHARS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+
+def _to_fulltext_query(query: str) -> str:
+    """
+    Turn free-text user input into a Lucene query for the skillSearch index.
+    Special characters are escaped and every term is prefix-matched, so
+    "pyth dev" finds "Python Development".
+    """
+    terms = (_LUCENE_SPECIAL_CHARS.sub(r"\\\1", term) for term in query.lower().split())
+    return " AND ".join(f"{term}*" for term in terms)
 
 class Neo4jClient:
     def __init__(self):
@@ -9,12 +54,39 @@ class Neo4jClient:
         password = os.getenv("NEO4J_PASSWORD")
 
         if not all([uri, username, password]):
-            print("Warning: Neo4j credentials not configured. Using mock mode.")
+            logger.warning("Neo4j credentials not configured. Using mock mode.")
             self.driver = None
             self.mock_mode = True
         else:
-            self.driver = GraphDatabase.driver(uri, auth=(username, password))
+            self.driver = GraphDatabase.driver(
+                uri,
+                auth=(username, password),
+                max_connection_pool_size=50,
+                connection_acquisition_timeout=30
+            )
             self.mock_mode = False
+            self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Create the fulltext index used by search_skills if it doesn't exist."""
+        try:
+            with self.driver.session() as session:
+                session.run(
+                    """
+                    CREATE FULLTEXT INDEX skillSearch IF NOT EXISTS
+                    FOR (s:Skill) ON EACH [s.name, s.category]
+                    """
+                ).consume()
+        except Exception as e:
+            logger.warning("Failed to create Neo4j skill search index: %s", e)
+
+    def _execute_read(self, query: str, extract: Callable[[Result], Any], **params) -> Any:
+        """
+        Run a read query in a managed transaction (retried on transient errors).
+        `extract` pulls the needed data out of the result inside the transaction.
+        """
+        with self.driver.session() as session:
+            return session.execute_read(lambda tx: extract(tx.run(query, **params)))
 
     def close(self):
         """Close the driver connection."""
@@ -24,91 +96,80 @@ class Neo4jClient:
     def get_related_skills(self, skill_name: str, limit: int = 10) -> List[str]:
         """Get skills related to the given skill."""
         if self.mock_mode:
-            # Return mock data for demo purposes
-            mock_skills = {
-                "Python": ["Django", "Flask", "FastAPI", "Data Analysis", "Machine Learning"],
-                "JavaScript": ["React", "Node.js", "TypeScript", "Vue.js", "Angular"],
-                "React": ["JavaScript", "TypeScript", "Redux", "Next.js", "HTML/CSS"],
-                "Machine Learning": ["Python", "TensorFlow", "PyTorch", "Data Science", "Statistics"],
-            }
-            return mock_skills.get(skill_name, ["Data Analysis", "Problem Solving", "Communication"])
+            return list(_MOCK_RELATED.get(skill_name, _MOCK_RELATED_DEFAULT)[:limit])
 
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s:Skill {name: $skill_name})-[:RELATED_TO|REQUIRES]-(related:Skill)
-                RETURN related.name as skill
-                LIMIT $limit
-                """,
-                skill_name=skill_name,
-                limit=limit
-            )
-            return [record["skill"] for record in result]
+        return self._execute_read(
+            """
+            MATCH (s:Skill {name: $skill_name})-[:RELATED_TO|REQUIRES]-(related:Skill)
+            RETURN related.name as skill
+            LIMIT $limit
+            """,
+            lambda result: result.value("skill"),
+            skill_name=skill_name,
+            limit=limit
+        )
 
     def get_skill_prerequisites(self, skill_name: str) -> List[str]:
         """Get prerequisite skills for the given skill."""
         if self.mock_mode:
-            mock_prereqs = {
-                "React": ["JavaScript", "HTML/CSS"],
-                "Django": ["Python", "Web Development Basics"],
-                "Machine Learning": ["Python", "Statistics", "Linear Algebra"],
-                "FastAPI": ["Python", "REST APIs"],
-            }
-            return mock_prereqs.get(skill_name, [])
+            return list(_MOCK_PREREQS.get(skill_name, ()))
 
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s:Skill {name: $skill_name})<-[:REQUIRES]-(prereq:Skill)
-                RETURN prereq.name as skill
-                """,
-                skill_name=skill_name
-            )
-            return [record["skill"] for record in result]
+        return self._execute_read(
+            """
+            MATCH (s:Skill {name: $skill_name})<-[:REQUIRES]-(prereq:Skill)
+            RETURN prereq.name as skill
+            """,
+            lambda result: result.value("skill"),
+            skill_name=skill_name
+        )
 
     def get_skill_learning_path(self, start_skill: str, target_skill: str) -> List[str]:
         """Find a learning path between two skills."""
         if self.mock_mode:
             return [start_skill, "Intermediate Skill", target_skill]
 
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH path = shortestPath(
-                    (start:Skill {name: $start_skill})-[:RELATED_TO|REQUIRES*]-(target:Skill {name: $target_skill})
-                )
-                RETURN [node in nodes(path) | node.name] as skills
-                """,
-                start_skill=start_skill,
-                target_skill=target_skill
+        record = self._execute_read(
+            """
+            MATCH path = shortestPath(
+                (start:Skill {name: $start_skill})-[:RELATED_TO|REQUIRES*]-(target:Skill {name: $target_skill})
             )
-            record = result.single()
-            return record["skills"] if record else []
+            RETURN [node in nodes(path) | node.name] as skills
+            """,
+            lambda result: result.single(),
+            start_skill=start_skill,
+            target_skill=target_skill
+        )
+        return record.value("skills") if record else []
 
     def search_skills(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Search for skills matching the query."""
         if self.mock_mode:
-            mock_results = [
-                {"name": "Python Programming", "category": "Programming"},
-                {"name": "JavaScript Development", "category": "Programming"},
-                {"name": "Machine Learning", "category": "Data Science"},
-                {"name": "React Development", "category": "Web Development"},
-                {"name": "Data Analysis", "category": "Data Science"},
-            ]
-            return [s for s in mock_results if query.lower() in s["name"].lower()][:limit]
-
-        with self.driver.session() as session:
-            result = session.run(
-                """
-                MATCH (s:Skill)
-                WHERE s.name CONTAINS $query OR s.category CONTAINS $query
-                RETURN s.name as name, s.category as category
-                LIMIT $limit
-                """,
-                query=query,
-                limit=limit
+            query = query.lower()
+            matches = (
+                {"name": name, "category": category}
+                for name, category, name_lower in _MOCK_SEARCH
+                if query in name_lower
             )
-            return [{"name": record["name"], "category": record["category"]} for record in result]
+            return list(islice(matches, limit))
+
+        fulltext_query = _to_fulltext_query(query)
+        if not fulltext_query:
+            return []
+
+        # Indexed lookup via the skillSearch fulltext index instead of a label scan
+        return self._execute_read(
+            """
+            CALL db.index.fulltext.queryNodes('skillSearch', $query) YIELD node, score
+            RETURN node.name as name, node.category as category
+            ORDER BY score DESC
+            LIMIT $limit
+            """,
+            lambda result: result.data(),
+            query=fulltext_query,
+            limit=limit
+        )
 
-# Global instance
-neo4j_client = Neo4jClient()
+# Global instance, created on first use so importing this module has no side effects
+@cache
+def get_neo4j_client() -> Neo4jClient:
+    return Neo4jClient()
@@ -1,49 +1,255 @@
-import redis
-import json
+import logging
+import redis.asyncio as aioredis
+import orjson
 import os
-from typing import Optional, Any
+from functools import cache
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Tuple, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Marks an L1 entry that so far only holds encoded bytes
+_UNDECODED = object()
 
 class RedisClient:
-    def __init__(self):
+    """
+    Two-level cache: a bounded in-process LRU (L1) in front of Redis (L2).
+    L1 holds each value decoded and/or as its encoded bytes (each filled in
+    on first use), so hot keys skip the network round-trip and repeat
+    JSON decoding or encoding.
+    """
+
+    def __init__(
+        self,
+        default_in_memory_ttl: int = 60,
+        default_redis_ttl: int = 3600,
+        max_in_memory_size: int = 1024
+    ):
+        self.default_in_memory_ttl = default_in_memory_ttl
+        self.default_redis_ttl = default_redis_ttl
+        self.max_in_memory_size = max_in_memory_size
+        # key -> (expire_ts, decoded value or _UNDECODED, encoded bytes or None)
+        self._l1: "OrderedDict[str, Tuple[float, Any, Optional[bytes]]]" = OrderedDict()
+
         redis_url = os.getenv("REDIS_URL")
 
         if not redis_url:
-            print("Warning: Redis URL not configured. Using mock mode.")
+            logger.warning("Redis URL not configured. Using mock mode.")
+            self.pool = None
             self.client = None
             self.mock_mode = True
             self.mock_cache = {}
         else:
-            self.client = redis.from_url(redis_url, decode_responses=True)
+            # Blocking pool: callers wait for a free connection instead of
+            # failing with "max clients reached" under load
+            self.pool = aioredis.BlockingConnectionPool.from_url(
+                redis_url,
+                # Values are orjson-encoded bytes; keep them as bytes on read
+                decode_responses=False,
+                max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+                timeout=int(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+            )
+            self.client = aioredis.Redis(connection_pool=self.pool)
             self.mock_mode = False
 
-    def set(self, key: str, value: Any, expire_seconds: int = 3600) -> bool:
-        """Set a key-value pair with expiration."""
+    async def close(self) -> None:
+        """Close the client and release pooled connections."""
+        if self.client:
+            # Redis() built on an explicit pool doesn't own it, so close the pool too
+            await self.client.aclose(close_connection_pool=True)
+
+    def _l1_entry(self, key: str) -> Optional[Tuple[float, Any, Optional[bytes]]]:
+        entry = self._l1.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        # Re-insert to mark as most recently used
+        self._l1[key] = entry
+        return entry
+
+    def _l1_get(self, key: str) -> Optional[Any]:
+        entry = self._l1_entry(key)
+        if entry is None:
+            return None
+        expire_ts, value, raw = entry
+        if value is _UNDECODED:
+            value = orjson.loads(raw)
+            self._l1[key] = (expire_ts, value, raw)
+        return value
+
+    def _l1_get_raw(self, key: str) -> Optional[bytes]:
+        entry = self._l1_entry(key)
+        if entry is None:
+            return None
+        expire_ts, value, raw = entry
+        if raw is None:
+            raw = orjson.dumps(value)
+            self._l1[key] = (expire_ts, value, raw)
+        return raw
+
+    def _l1_set(
+        self,
+        key: str,
+        value: Any,
+        expire_seconds: float,
+        raw: Optional[bytes] = None
+    ) -> None:
+        ttl = min(expire_seconds, self.default_in_memory_ttl)
+        self._l1.pop(key, None)
+        self._l1[key] = (time.monotonic() + ttl, value, raw)
+        while len(self._l1) > self.max_in_memory_size:
+            self._l1.popitem(last=False)
+
+    def _remaining_ttl(self, pttl: int) -> float:
+        """Seconds an entry read back from Redis may live in L1: never past its Redis expiry."""
+        if pttl < 0:
+            # -1: key has no expiry; -2: key vanished between commands
+            return self.default_in_memory_ttl if pttl == -1 else 0
+        return pttl / 1000
+
+    async def set(self, key: str, value: Any, expire_seconds: Optional[int] = None) -> bool:
+        """Set a key-value pair with expiration in both cache layers."""
+        if expire_seconds is None:
+            expire_seconds = self.default_redis_ttl
+        raw = orjson.dumps(value)
+        self._l1_set(key, value, expire_seconds, raw)
+
         if self.mock_mode:
-            self.mock_cache[key] = json.dumps(value)
+            self.mock_cache[key] = raw
             return True
 
         try:
-            self.client.setex(key, expire_seconds, json.dumps(value))
+            await self.client.setex(key, expire_seconds, raw)
             return True
-        except Exception as e:
-            print(f"Redis set error: {e}")
+        except Exception:
+            logger.exception("Redis set error")
             return False
 
-    def get(self, key: str) -> Optional[Any]:
-        """Get a value by key."""
+    async def get(self, key: str, skip_l1: bool = False) -> Optional[Any]:
+        """
+        Get a value by key, checking the in-memory layer first.
+        Pass skip_l1=True to read the shared Redis copy, e.g. before a read-modify-write.
+        """
+        if not skip_l1:
+            value = self._l1_get(key)
+            if value is not None:
+                return value
+
+        if self.mock_mode:
+            raw = self.mock_cache.get(key)
+            return orjson.loads(raw) if raw else None
+
+        try:
+            # Fetch the remaining TTL in the same round-trip so L1 can't outlive the Redis entry
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                raw, pttl = await pipe.execute()
+            if not raw:
+                return None
+            value = orjson.loads(raw)
+            self._l1_set(key, value, self._remaining_ttl(pttl), raw)
+            return value
+        except Exception:
+            logger.exception("Redis get error")
+            return None
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        """Get the JSON-encoded bytes for a key without decoding them."""
+        raw = self._l1_get_raw(key)
+        if raw is not None:
+            return raw
+
         if self.mock_mode:
-            value = self.mock_cache.get(key)
-            return json.loads(value) if value else None
+            return self.mock_cache.get(key)
 
         try:
-            value = self.client.get(key)
-            return json.loads(value) if value else None
-        except Exception as e:
-            print(f"Redis get error: {e}")
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                raw, pttl = await pipe.execute()
+            if raw:
+                self._l1_set(key, _UNDECODED, self._remaining_ttl(pttl), raw)
+            return raw
+        except Exception:
+            logger.exception("Redis get_raw error")
             return None
 
-    def delete(self, key: str) -> bool:
-        """Delete a key."""
+    async def set_raw(self, key: str, raw: bytes, expire_seconds: Optional[int] = None) -> bool:
+        """Store already JSON-encoded bytes for a key."""
+        if expire_seconds is None:
+            expire_seconds = self.default_redis_ttl
+        self._l1_set(key, _UNDECODED, expire_seconds, raw)
+
+        if self.mock_mode:
+            self.mock_cache[key] = raw
+            return True
+
+        try:
+            await self.client.setex(key, expire_seconds, raw)
+            return True
+        except Exception:
+            logger.exception("Redis set_raw error")
+            return False
+
+    async def mset(self, items: Dict[str, Any], expire_seconds: Optional[int] = None) -> bool:
+        """Set multiple key-value pairs in a single pipelined round-trip."""
+        if not items:
+            return True
+        if expire_seconds is None:
+            expire_seconds = self.default_redis_ttl
+        encoded = {key: orjson.dumps(value) for key, value in items.items()}
+        for key, value in items.items():
+            self._l1_set(key, value, expire_seconds, encoded[key])
+
+        if self.mock_mode:
+            self.mock_cache.update(encoded)
+            return True
+
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, raw in encoded.items():
+                    pipe.setex(key, expire_seconds, raw)
+                await pipe.execute()
+            return True
+        except Exception:
+            logger.exception("Redis mset error")
+            return False
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get multiple values in one round-trip. Missing keys map to None."""
+        values = [self._l1_get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        if self.mock_mode:
+            for i in missing:
+                raw = self.mock_cache.get(keys[i])
+                values[i] = orjson.loads(raw) if raw else None
+            return values
+
+        try:
+            # One round-trip: MGET plus each key's remaining TTL for L1
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.mget([keys[i] for i in missing])
+                for i in missing:
+                    pipe.pttl(keys[i])
+                raw_values, *pttls = await pipe.execute()
+        except Exception:
+            logger.exception("Redis mget error")
+            return values
+
+        for i, raw, pttl in zip(missing, raw_values, pttls):
+            if raw:
+                values[i] = orjson.loads(raw)
+                self._l1_set(keys[i], values[i], self._remaining_ttl(pttl), raw)
+        return values
+
+    async def delete(self, key: str) -> bool:
+        """Delete a key from both cache layers."""
+        self._l1.pop(key, None)
+
         if self.mock_mode:
             if key in self.mock_cache:
                 del self.mock_cache[key]
@@ -51,22 +257,27 @@ class RedisClient:
             return False
 
         try:
-            self.client.delete(key)
+            await self.client.delete(key)
             return True
-        except Exception as e:
-            print(f"Redis delete error: {e}")
+        except Exception:
+            logger.exception("Redis delete error")
             return False
 
-    def exists(self, key: str) -> bool:
+    async def exists(self, key: str) -> bool:
         """Check if a key exists."""
+        if self._l1_entry(key) is not None:
+            return True
+
         if self.mock_mode:
             return key in self.mock_cache
 
         try:
-            return bool(self.client.exists(key))
-        except Exception as e:
-            print(f"Redis exists error: {e}")
+            return bool(await self.client.exists(key))
+        except Exception:
+            logger.exception("Redis exists error")
             return False
 
-# Global instance
-redis_client = RedisClient()
+# Global instance, created on first use so importing this module has no side effects
+@cache
+def get_redis_client() -> RedisClient:
+    return RedisClient()
@@ -1,15 +1,19 @@
+import logging
 from supabase import create_client, Client
 import os
-from typing import Optional, Dict, Any, List
+from functools import cache
+from typing import Optional, Dict, Any, List, AsyncIterator
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class SupabaseClient:
     def __init__(self):
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
 
         if not url or not key:
-            print("Warning: Supabase credentials not configured. Using mock mode.")
+            logger.warning("Supabase credentials not configured. Using mock mode.")
             self.client: Optional[Client] = None
             self.mock_mode = True
         else:
@@ -54,6 +58,23 @@ class SupabaseClient:
             "last_login": datetime.utcnow().isoformat()
         }).eq("username", username).execute()
 
+    async def upsert_user(self, username: str) -> Dict[str, Any]:
+        """Create the user or refresh their last login in a single call."""
+        now = datetime.utcnow().isoformat()
+        if self.mock_mode:
+            return {
+                "username": username,
+                "created_at": now,
+                "last_login": now
+            }
+
+        data = {
+            "username": username,
+            "last_login": now
+        }
+        result = self.client.table("users").upsert(data, on_conflict="username").execute()
+        return result.data[0] if result.data else data
+
     async def save_roadmap(self, roadmap_data: Dict[str, Any]) -> Dict[str, Any]:
         """Save a roadmap to the database."""
         if self.mock_mode:
@@ -86,5 +107,12 @@ class SupabaseClient:
         result = self.client.table("roadmaps").select("*").eq("user_id", username).execute()
         return result.data if result.data else []
 
-# Global instance
-supabase_client = SupabaseClient()
+    async def iter_user_roadmaps(self, username: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a user's roadmaps; the SDK returns them in one response, so this just iterates it."""
+        for roadmap in await self.get_user_roadmaps(username):
+            yield roadmap
+
+# Global instance, created on first use so importing this module has no side effects
+@cache
+def get_supabase_client() -> SupabaseClient:
+    return SupabaseClient()
@@ -1,8 +1,55 @@
+import logging
 import httpx
+import ijson
 import os
-from typing import Optional, Dict, Any, List
-from datetime import datetime
-import json
+from typing import Optional, Dict, Any, List, AsyncIterator
+from datetime import datetime, timezone
+from functools import cache, lru_cache
+from pathlib import Path
+import orjson
+import time
+
+logger = logging.getLogger(__name__)
+
+MCP_CONFIG_PATH = Path(__file__).resolve().parents[2] / ".mcp.json"
+
+@cache
+def _load_mcp_config(path: Path = MCP_CONFIG_PATH) -> Dict[str, Any]:
+    """Parse the MCP config file once; returns {} if it doesn't exist."""
+    if not path.exists():
+        return {}
+    return orjson.loads(path.read_bytes())
+
+def _resolve_mcp_url() -> Optional[str]:
+    """MCP server URL from MCP_SUPABASE_URL, falling back to .mcp.json."""
+    mcp_url = os.getenv("MCP_SUPABASE_URL")
+    if mcp_url:
+        return mcp_url
+    return _load_mcp_config().get('mcpServers', {}).get('supabase', {}).get('url')
+
+@lru_cache(maxsize=1)
+def _iso_for_second(epoch_second: int) -> str:
+    return datetime.fromtimestamp(epoch_second, timezone.utc).isoformat()
+
+def _now_iso() -> str:
+    """Current UTC time as ISO string, truncated to (and cached per) second."""
+    return _iso_for_second(int(time.time()))
+
+class _AsyncChunkReader:
+    """Async file-like adapter so ijson can parse an httpx byte stream incrementally."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) to detect bytes vs str; don't consume a chunk for it
+        if size == 0:
+            return b""
+        # ijson treats an empty read as EOF, so skip empty chunks
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b""
 
 class SupabaseMCPClient:
     """
@@ -11,87 +58,130 @@ class SupabaseMCPClient:
     """
 
     def __init__(self):
-        # Read MCP config
-        mcp_config_path = os.path.join(os.path.dirname(__file__), "../../.mcp.json")
         self.mcp_url = None
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY")
         self.mock_mode = True
+        self._http: Optional[httpx.AsyncClient] = None
 
         try:
-            if os.path.exists(mcp_config_path):
-                with open(mcp_config_path, 'r') as f:
-                    config = json.load(f)
-                    if 'mcpServers' in config and 'supabase' in config['mcpServers']:
-                        self.mcp_url = config['mcpServers']['supabase']['url']
-
-                        # Only enable MCP mode if we have Supabase credentials for auth
-                        if self.supabase_url and self.supabase_key:
-                            self.mock_mode = False
-                            print(f"✓ Supabase MCP client initialized with URL: {self.mcp_url}")
-                            print(f"✓ Using Supabase credentials for MCP authentication")
-                        else:
-                            print(f"⚠ Supabase MCP URL found but SUPABASE_URL/KEY not set")
-                            print(f"  Add these to .env to enable MCP mode:")
-                            print(f"  SUPABASE_URL=your-project-url")
-                            print(f"  SUPABASE_KEY=your-anon-key")
+            self.mcp_url = _resolve_mcp_url()
+            if self.mcp_url:
+                # Only enable MCP mode if we have Supabase credentials for auth
+                if self.supabase_url and self.supabase_key:
+                    self.mock_mode = False
+                    logger.info("Supabase MCP client initialized with URL: %s", self.mcp_url)
+                else:
+                    logger.warning(
+                        "Supabase MCP URL found but SUPABASE_URL/KEY not set. "
+                        "Add them to .env to enable MCP mode."
+                    )
 
             if self.mock_mode:
-                print("Warning: Supabase MCP not fully configured. Using mock mode.")
+                logger.warning("Supabase MCP not fully configured. Using mock mode.")
                 self.mock_data = {
                     'users': {},
                     'roadmaps': {}
                 }
+            else:
+                # Shared keep-alive client so MCP calls reuse TCP/TLS connections
+                self._http = httpx.AsyncClient(
+                    timeout=30.0,
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+                    headers={
+                        'Content-Type': 'application/json',
+                        'apikey': self.supabase_key,
+                        'Authorization': f'Bearer {self.supabase_key}'
+                    }
+                )
         except Exception as e:
-            print(f"Warning: Failed to load Supabase MCP config: {e}. Using mock mode.")
+            logger.warning("Failed to load Supabase MCP config: %s. Using mock mode.", e)
             self.mock_mode = True
             self.mock_data = {
                 'users': {},
                 'roadmaps': {}
             }
 
+    @staticmethod
+    def _rpc_body(tool: str, arguments: Dict[str, Any]) -> bytes:
+        return orjson.dumps({
+            "jsonrpc": "2.0",
+            "method": "tools/call",
+            "params": {
+                "name": tool,
+                "arguments": arguments
+            },
+            "id": 1
+        })
+
     async def _call_mcp(self, tool: str, arguments: Dict[str, Any]) -> Any:
         """Call the Supabase MCP server with a tool and arguments."""
         if self.mock_mode:
             return None
 
-        # Add Supabase authentication headers
-        headers = {
-            'Content-Type': 'application/json',
-            'apikey': self.supabase_key,
-            'Authorization': f'Bearer {self.supabase_key}'
-        }
+        response = await self._http.post(self.mcp_url, content=self._rpc_body(tool, arguments))
+        response.raise_for_status()
+        result = orjson.loads(response.content)
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                self.mcp_url,
-                headers=headers,
-                json={
-                    "jsonrpc": "2.0",
-                    "method": "tools/call",
-                    "params": {
-                        "name": tool,
-                        "arguments": arguments
-                    },
-                    "id": 1
-                }
-            )
+        if 'error' in result:
+            raise Exception(f"MCP Error: {result['error']}")
+
+        return result.get('result', {})
+
+    async def _call_mcp_stream(self, tool: str, arguments: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Call the Supabase MCP server and yield rows from result.data as they are parsed,
+        without buffering the whole response body.
+        A top-level JSON-RPC "error" raises, like _call_mcp.
+        """
+        if self.mock_mode:
+            return
+
+        async with self._http.stream("POST", self.mcp_url, content=self._rpc_body(tool, arguments)) as response:
             response.raise_for_status()
-            result = response.json()
+            reader = _AsyncChunkReader(response.aiter_bytes())
+            # Walk parse events so both rows and an error object are seen in one pass
+            builder = None
+            target = None
+            depth = 0
+            async for prefix, event, value in ijson.parse_async(reader, use_float=True):
+                if builder is None:
+                    if prefix not in ("result.data.item", "error"):
+                        continue
+                    if event not in ("start_map", "start_array"):
+                        if prefix == "error":
+                            raise Exception(f"MCP Error: {value}")
+                        yield value
+                        continue
+                    builder = ijson.ObjectBuilder()
+                    target = prefix
 
-            if 'error' in result:
-                raise Exception(f"MCP Error: {result['error']}")
+                builder.event(event, value)
+                if event in ("start_map", "start_array"):
+                    depth += 1
+                elif event in ("end_map", "end_array"):
+                    depth -= 1
+                    if depth == 0:
+                        if target == "error":
+                            raise Exception(f"MCP Error: {builder.value}")
+                        yield builder.value
+                        builder = None
 
-            return result.get('result', {})
+    async def close(self) -> None:
+        """Close the shared HTTP client."""
+        if self._http:
+            await self._http.aclose()
 
     async def create_user(self, username: str) -> Dict[str, Any]:
         """Create a new user."""
+        now = datetime.now(timezone.utc).isoformat()
+        user_data = {
+            "username": username,
+            "created_at": now,
+            "last_login": now
+        }
         if self.mock_mode:
-            user_data = {
-                "username": username,
-                "created_at": datetime.utcnow().isoformat(),
-                "last_login": datetime.utcnow().isoformat()
-            }
             self.mock_data['users'][username] = user_data
             return user_data
 
@@ -99,21 +189,13 @@ class SupabaseMCPClient:
             # Use MCP to insert into users table
             result = await self._call_mcp('supabase_insert', {
                 'table': 'users',
-                'data': {
-                    'username': username,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'last_login': datetime.utcnow().isoformat()
-                }
+                'data': user_data
             })
             return result.get('data', [{}])[0] if result else {}
-        except Exception as e:
-            print(f"MCP create_user error: {e}")
+        except Exception:
+            logger.exception("MCP create_user error")
             # Fallback to mock
-            return {
-                "username": username,
-                "created_at": datetime.utcnow().isoformat(),
-                "last_login": datetime.utcnow().isoformat()
-            }
+            return user_data
 
     async def get_user(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user by username."""
@@ -129,25 +211,51 @@ class SupabaseMCPClient:
             })
             data = result.get('data', [])
             return data[0] if data else None
-        except Exception as e:
-            print(f"MCP get_user error: {e}")
+        except Exception:
+            logger.exception("MCP get_user error")
             return None
 
     async def update_last_login(self, username: str) -> None:
         """Update user's last login timestamp."""
         if self.mock_mode:
             if username in self.mock_data['users']:
-                self.mock_data['users'][username]['last_login'] = datetime.utcnow().isoformat()
+                self.mock_data['users'][username]['last_login'] = _now_iso()
             return
 
         try:
             await self._call_mcp('supabase_update', {
                 'table': 'users',
                 'filters': {'username': username},
-                'data': {'last_login': datetime.utcnow().isoformat()}
+                'data': {'last_login': _now_iso()}
             })
-        except Exception as e:
-            print(f"MCP update_last_login error: {e}")
+        except Exception:
+            logger.exception("MCP update_last_login error")
+
+    async def upsert_user(self, username: str) -> Dict[str, Any]:
+        """Create the user or refresh their last login in a single call."""
+        now = _now_iso()
+        if self.mock_mode:
+            user_data = self.mock_data['users'].setdefault(username, {
+                "username": username,
+                "created_at": now
+            })
+            user_data['last_login'] = now
+            return user_data
+
+        try:
+            result = await self._call_mcp('supabase_upsert', {
+                'table': 'users',
+                'on_conflict': 'username',
+                'data': {
+                    'username': username,
+                    'last_login': now
+                }
+            })
+            data = result.get('data', []) if result else []
+            return data[0] if data else {"username": username, "last_login": now}
+        except Exception:
+            logger.exception("MCP upsert_user error")
+            return {"username": username, "last_login": now}
 
     async def save_roadmap(self, roadmap_data: Dict[str, Any]) -> Dict[str, Any]:
         """Save a roadmap to the database."""
@@ -162,12 +270,15 @@ class SupabaseMCPClient:
                 'data': roadmap_data
             })
             return result.get('data', [roadmap_data])[0] if result else roadmap_data
-        except Exception as e:
-            print(f"MCP save_roadmap error: {e}")
+        except Exception:
+            logger.exception("MCP save_roadmap error")
             return roadmap_data
 
     async def get_roadmap(self, roadmap_id: str) -> Optional[Dict[str, Any]]:
-        """Get a roadmap by ID."""
+        """
+        Get a roadmap by ID. Returns None only when the roadmap doesn't exist;
+        database errors are raised so callers never mistake them for a miss.
+        """
         if self.mock_mode:
             return self.mock_data['roadmaps'].get(roadmap_id)
 
@@ -177,11 +288,11 @@ class SupabaseMCPClient:
                 'filters': {'id': roadmap_id},
                 'limit': 1
             })
-            data = result.get('data', [])
-            return data[0] if data else None
-        except Exception as e:
-            print(f"MCP get_roadmap error: {e}")
-            return None
+        except Exception:
+            logger.exception("MCP get_roadmap error")
+            raise
+        data = result.get('data', [])
+        return data[0] if data else None
 
     async def update_roadmap(self, roadmap_id: str, roadmap_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update a roadmap."""
@@ -196,26 +307,37 @@ class SupabaseMCPClient:
                 'data': roadmap_data
             })
             return result.get('data', [roadmap_data])[0] if result else roadmap_data
-        except Exception as e:
-            print(f"MCP update_roadmap error: {e}")
+        except Exception:
+            logger.exception("MCP update_roadmap error")
             return roadmap_data
 
-    async def get_user_roadmaps(self, username: str) -> List[Dict[str, Any]]:
-        """Get all roadmaps for a user."""
+    async def iter_user_roadmaps(self, username: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a user's roadmaps one at a time as they are streamed from the database.
+        Errors are logged and re-raised, so a failed or cut-off stream is never mistaken for a complete list.
+        """
         if self.mock_mode:
-            return [rm for rm in self.mock_data['roadmaps'].values()
-                    if rm.get('user_id') == username]
+            for rm in list(self.mock_data['roadmaps'].values()):
+                if rm.get('user_id') == username:
+                    yield rm
+            return
 
         try:
-            result = await self._call_mcp('supabase_select', {
+            async for rm in self._call_mcp_stream('supabase_select', {
                 'table': 'roadmaps',
                 'filters': {'user_id': username},
                 'order': {'column': 'created_at', 'ascending': False}
-            })
-            return result.get('data', [])
-        except Exception as e:
-            print(f"MCP get_user_roadmaps error: {e}")
-            return []
+            }):
+                yield rm
+        except Exception:
+            logger.exception("MCP get_user_roadmaps error")
+            raise
+
+    async def get_user_roadmaps(self, username: str) -> List[Dict[str, Any]]:
+        """Get all roadmaps for a user."""
+        return [rm async for rm in self.iter_user_roadmaps(username)]
 
-# Global instance
-supabase_mcp_client = SupabaseMCPClient()
+# Global instance, created on first use so importing this module has no side effects
+@cache
+def get_supabase_mcp_client() -> SupabaseMCPClient:
+    return SupabaseMCPClient()
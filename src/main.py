@@ -1,13 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+import logging
+import logging.handlers
 import os
+import queue
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging: handlers enqueue records and a background listener
+# thread does the formatting and stream I/O off the request path
+log_queue = queue.Queue(-1)
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler, respect_handler_level=True)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[queue_handler])
+# httpx logs every request at INFO, which would log each MCP call
+logging.getLogger("httpx").setLevel(logging.WARNING)
+log_listener.start()
+
 # Import routers
 from .api import auth_routes, roadmap_routes
+from .db.redis_client import get_redis_client
+from .db.supabase_mcp_client import get_supabase_mcp_client
 
 # Create FastAPI app
 app = FastAPI(
@@ -35,7 +53,7 @@ if frontend_url and frontend_url not in allowed_origins:
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
-    allow_origin_regex=r"https://.*\.vercel\.app",  # Regex for Vercel deployments
+    allow_origin_regex=r"https://([a-z0-9-]+\.)*vercel\.app",  # Regex for Vercel deployments
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -46,6 +64,16 @@ app.add_middleware(
 app.include_router(auth_routes.router)
 app.include_router(roadmap_routes.router)
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled database connections."""
+    # Only close clients that were actually created
+    if get_redis_client.cache_info().currsize:
+        await get_redis_client().close()
+    if get_supabase_mcp_client.cache_info().currsize:
+        await get_supabase_mcp_client().close()
+    log_listener.stop()
+
 @app.get("/")
 async def root():
     """Root endpoint - API status check."""
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Literal
 from datetime import datetime
 
@@ -17,25 +17,31 @@ class Token(BaseModel):
     token_type: str = "bearer"
     username: str
 
+# Shared Literal aliases, declared once and reused by every model below
+DifficultyLevel = Literal['beginner', 'intermediate', 'advanced']
+LearningStyle = Literal['visual', 'hands-on', 'reading', 'mixed']
+ResourceType = Literal['video', 'article', 'documentation', 'interactive-lab', 'book']
+
 # Skill Models
 class SkillAssessment(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     skill: str
     score: int = Field(ge=1, le=10)
-    level: Literal['beginner', 'intermediate', 'advanced']
+    level: DifficultyLevel
     last_used: Optional[str] = None
 
 # Learning Preferences
 class LearningPreferences(BaseModel):
-    learning_style: Optional[Literal['visual', 'hands-on', 'reading', 'mixed']] = None
+    model_config = ConfigDict(frozen=True)
+
+    learning_style: Optional[LearningStyle] = None
     time_commitment_hours_per_week: Optional[int] = Field(None, ge=1, le=168)
     focus_areas: Optional[List[str]] = None
     exclude_topics: Optional[List[str]] = None
     target_completion_date: Optional[str] = None
 
 # Resource Models
-ResourceType = Literal['video', 'article', 'documentation', 'interactive-lab', 'book']
-DifficultyLevel = Literal['beginner', 'intermediate', 'advanced']
-
 class LearningResource(BaseModel):
     title: str
     type: ResourceType
@@ -1,50 +1,55 @@
 import google.generativeai as genai
+import hashlib
+import logging
 import os
-import json
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+import orjson
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cache
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
 import uuid
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY", ""))
-
-class ScoutClient:
-    """
-    Scout MCP client for roadmap generation.
-    Directly integrates with Google Gemini for roadmap generation.
-    """
-
-    def __init__(self):
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash')
-
-    def _build_roadmap_prompt(
-        self,
-        career_goal: str,
-        current_skills: List[Dict[str, Any]],
-        learning_preferences: Optional[Dict[str, Any]] = None
-    ) -> str:
-        """Build a detailed prompt for roadmap generation."""
-
-        skills_summary = "\n".join([
-            f"- {skill['skill']}: Level {skill['score']}/10 ({skill['level']})"
-            for skill in current_skills
-        ])
-
-        preferences_text = ""
-        if learning_preferences:
-            style = learning_preferences.get('learning_style', 'mixed')
-            hours = learning_preferences.get('time_commitment_hours_per_week', 10)
-            preferences_text = f"""
-Learning Preferences:
-- Learning Style: {style}
-- Time Commitment: {hours} hours/week
-"""
-
-        prompt = f"""You are Scout, an AI career advisor. Generate a concise learning roadmap.
-
-GOAL: {career_goal}
-CURRENT SKILLS: {skills_summary}
-{preferences_text}
+from pydantic import ValidationError
+
+from ..models.schemas import Roadmap
+
+logger = logging.getLogger(__name__)
+
+_GEMINI_SCHEMA_KEYS = ("type", "format", "description", "enum", "items", "properties", "required")
+
+def _to_gemini_schema(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a Pydantic JSON schema to the OpenAPI subset Gemini accepts: inline $refs, Optional -> nullable."""
+    if "$ref" in node:
+        return _to_gemini_schema(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in node:
+        variant = next(v for v in node["anyOf"] if v.get("type") != "null")
+        return {**_to_gemini_schema(variant, defs), "nullable": True}
+    schema = {key: node[key] for key in _GEMINI_SCHEMA_KEYS if key in node}
+    if "properties" in schema:
+        schema["properties"] = {
+            name: _to_gemini_schema(prop, defs) for name, prop in schema["properties"].items()
+        }
+    if "items" in schema:
+        schema["items"] = _to_gemini_schema(schema["items"], defs)
+    return schema
+
+def _roadmap_response_schema() -> Dict[str, Any]:
+    """Schema for the generated roadmap content, derived from the Roadmap model (server-set fields left out)."""
+    fields = ("title", "career_goal", "estimated_weeks", "modules")
+    json_schema = Roadmap.model_json_schema()
+    schema = _to_gemini_schema(json_schema, json_schema.get("$defs", {}))
+    schema["properties"] = {name: schema["properties"][name] for name in fields}
+    schema["required"] = [name for name in schema["required"] if name in fields]
+    return schema
+
+ROADMAP_SCHEMA = _roadmap_response_schema()
+ROADMAP_BATCH_SCHEMA = {"type": "array", "items": ROADMAP_SCHEMA}
+
+# Prompts put the invariant instructions first and the per-request inputs last,
+# so the shared prefix is eligible for the model provider's prompt prefix caching
+_ROADMAP_PROMPT_PREFIX = """You are Scout, an AI career advisor. Generate a concise learning roadmap for the GOAL and CURRENT SKILLS given at the end of this prompt.
 
 CREATE a structured roadmap with 3-5 modules. Each module needs:
 - Title, description, estimated hours
@@ -57,12 +62,12 @@ CREATE a structured roadmap with 3-5 modules. Each module needs:
 Keep it practical and achievable. Total: 8-16 weeks
 
 OUTPUT FORMAT (strict JSON):
-{{
+{
   "title": "Roadmap title",
-  "career_goal": "{career_goal}",
+  "career_goal": "<career_goal>",
   "estimated_weeks": <number>,
   "modules": [
-    {{
+    {
       "id": "module-1",
       "title": "Module title",
       "description": "What this module covers",
@@ -72,7 +77,7 @@ OUTPUT FORMAT (strict JSON):
       "prerequisite_skills": ["skill1"],
       "learning_outcomes": ["outcome1", "outcome2"],
       "resources": [
-        {{
+        {
           "title": "Resource title",
           "type": "video|article|documentation|interactive-lab|book",
           "url": "https://...",
@@ -80,86 +85,383 @@ OUTPUT FORMAT (strict JSON):
           "duration_minutes": 120,
           "difficulty": "beginner|intermediate|advanced",
           "description": "Brief description"
-        }}
+        }
       ],
-      "project": {{
+      "project": {
         "title": "Project title",
         "description": "What to build",
         "estimated_hours": <number>,
         "skills_applied": ["skill1", "skill2"],
         "deliverables": ["deliverable1", "deliverable2"],
         "difficulty": "beginner|intermediate|advanced"
-      }}
-    }}
+      }
+    }
   ]
-}}
+}
 
 IMPORTANT: Return ONLY valid JSON, no markdown formatting, no explanation text.
 """
-        return prompt
 
-    async def generate_roadmap(
+_ROADMAP_PROMPT_INPUT = """
+GOAL: %s
+CURRENT SKILLS:
+%s
+%s"""
+
+_SKILL_LINE = "- %s: Level %d/10 (%s)"
+
+def format_skills_summary(current_skills: List[Dict[str, Any]]) -> str:
+    """One prompt line per skill; callers that reuse a skillset can build this once and pass it in."""
+    return "\n".join(_SKILL_LINE % (s['skill'], s['score'], s['level']) for s in current_skills)
+
+_BATCH_PROMPT_INSTRUCTIONS = """
+BATCH MODE: Produce a JSON array of %d roadmaps, one per INPUT block below, in the same order.
+Each array element uses the OUTPUT FORMAT above.
+"""
+
+_BATCH_INPUT_HEADER = """
+INPUT %d:"""
+
+_PREFERENCES_TEMPLATE = """
+Learning Preferences:
+- Learning Style: %s
+- Time Commitment: %s hours/week
+"""
+
+_UPDATE_PROMPT_PREFIX = """You are Scout, an expert career path advisor.
+
+The user has an existing roadmap and a request to change it; both are given at the end of this prompt.
+The roadmap is shown as an outline: its title, goal, length and each module's index, id, title, difficulty, hours and skills.
+Describe the change as a patch instead of repeating the whole roadmap. Only include what changes.
+
+OUTPUT FORMAT (strict JSON):
+{
+  "title": "New title (omit if unchanged)",
+  "estimated_weeks": <number, omit if unchanged>,
+  "modules": [
+    {"index": 1, "id": "module-1", "changes": {"title": "...", "resources": [...]}},
+    {"index": 2, "id": "module-2", "remove": true},
+    {"add": {<full module, same format as generation>}}
+  ]
+}
+
+Refer to existing modules by their outline "index" (1 is the first module) and include their "id" when they have one.
+"changes" replaces the named module fields as a whole (send the full new list for list fields).
+Added modules must be complete and are appended after the existing ones.
+
+IMPORTANT: Return ONLY valid JSON, no markdown, no explanation.
+"""
+
+_UPDATE_PROMPT_INPUT = """
+EXISTING ROADMAP:
+%s
+
+USER REQUEST:
+"%s"
+"""
+
+_OUTLINE_MODULE_FIELDS = ("id", "title", "difficulty", "estimated_hours", "skills_taught")
+
+def _roadmap_outline(roadmap: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a roadmap the model needs to plan an update."""
+    return {
+        "title": roadmap.get("title"),
+        "career_goal": roadmap.get("career_goal"),
+        "estimated_weeks": roadmap.get("estimated_weeks"),
+        "modules": [
+            {"index": index, **{field: module.get(field) for field in _OUTLINE_MODULE_FIELDS}}
+            for index, module in enumerate(roadmap.get("modules", []), start=1)
+        ],
+    }
+
+def _patch_target(modules: List[Dict[str, Any]], entry: Dict[str, Any]) -> Optional[int]:
+    """
+    Position of the existing module a patch entry refers to.
+    Outline indices are 1-based. When the entry also names an id, the id wins;
+    the index only picks between modules sharing that id.
+    An id that matches no module rejects the entry.
+    """
+    index = entry.get("index")
+    position = None
+    if isinstance(index, int) and not isinstance(index, bool) and 1 <= index <= len(modules):
+        position = index - 1
+
+    if entry.get("id") is not None:
+        matches = [i for i, module in enumerate(modules) if module.get("id") == entry["id"]]
+        if not matches:
+            return None
+        return position if position in matches else matches[0]
+    return position
+
+def _apply_roadmap_patch(roadmap: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a copy of the roadmap with the model's patch applied.
+    Existing modules keep their order; removals and changes target a single module each.
+    """
+    updated = dict(roadmap)
+    for field in ("title", "estimated_weeks"):
+        if field in patch:
+            updated[field] = patch[field]
+
+    modules: List[Optional[Dict[str, Any]]] = list(roadmap.get("modules", []))
+    added = []
+    for entry in patch.get("modules", []):
+        if "add" in entry:
+            added.append(entry["add"])
+            continue
+        target = _patch_target(modules, entry)
+        if target is None or modules[target] is None:
+            continue
+        if entry.get("remove"):
+            modules[target] = None
+        else:
+            modules[target] = {**modules[target], **entry.get("changes", {})}
+    updated["modules"] = [module for module in modules if module is not None] + added
+
+    # Give id-less modules (including added ones) a fresh module-N id
+    taken = {module.get("id") for module in updated["modules"]}
+    next_number = len(updated["modules"])
+    for position, module in enumerate(updated["modules"]):
+        if not module.get("id"):
+            while f"module-{next_number}" in taken:
+                next_number += 1
+            updated["modules"][position] = {**module, "id": f"module-{next_number}"}
+            taken.add(f"module-{next_number}")
+    return updated
+
+@dataclass(frozen=True, slots=True, order=True)
+class _SkillKey:
+    """Normalized skill entry used only in response cache keys."""
+    skill: str
+    score: int
+    level: str
+
+class ScoutClient:
+    """
+    Scout MCP client for roadmap generation.
+    Directly integrates with Google Gemini for roadmap generation.
+    Model output is cached per normalized request, so repeat requests
+    skip the Gemini round-trip.
+    """
+
+    def __init__(self, response_cache_ttl: int = 3600, response_cache_size: int = 256):
+        # JSON mode: the model returns bare JSON, so there are no markdown fences to strip
+        self.model = genai.GenerativeModel(
+            'models/gemini-2.5-flash',
+            generation_config={"response_mime_type": "application/json"}
+        )
+        self.response_cache_ttl = response_cache_ttl
+        self.response_cache_size = response_cache_size
+        self._response_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def _response_cache_key(
+        career_goal: str,
+        current_skills: List[Dict[str, Any]],
+        learning_preferences: Optional[Dict[str, Any]]
+    ) -> str:
+        """Hash of the request, ignoring case, extra whitespace and skill order."""
+        goal = " ".join(career_goal.casefold().split())
+        skills = sorted(
+            _SkillKey(" ".join(skill['skill'].casefold().split()), skill['score'], skill['level'])
+            for skill in current_skills
+        )
+        payload = orjson.dumps((goal, skills, learning_preferences), option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _get_cached_response(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._response_cache.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        self._response_cache[key] = entry
+        # Decode on every hit so callers never share mutable state
+        return self._parse_model_response(entry[1])
+
+    def _cache_response(self, key: str, response_text: str) -> None:
+        self._response_cache.pop(key, None)
+        self._response_cache[key] = (time.monotonic() + self.response_cache_ttl, response_text)
+        while len(self._response_cache) > self.response_cache_size:
+            self._response_cache.popitem(last=False)
+
+    @staticmethod
+    def _parse_model_response(response_text: str) -> Dict[str, Any]:
+        """Decode the model's JSON output."""
+        try:
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON from model ({e}): {response_text[:500]}") from e
+
+    async def _generate_text(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Stream a completion from Gemini without blocking the event loop and return the full text."""
+        response = await self.model.generate_content_async(
+            prompt, generation_config=generation_config, stream=True
+        )
+        return "".join([chunk.text async for chunk in response])
+
+    def _build_roadmap_input(
         self,
         career_goal: str,
         current_skills: List[Dict[str, Any]],
         learning_preferences: Optional[Dict[str, Any]] = None,
-        user_id: str = "anonymous"
-    ) -> Dict[str, Any]:
-        """Generate a personalized learning roadmap."""
+        skills_summary: Optional[str] = None
+    ) -> str:
+        """Build the per-request part of a roadmap prompt."""
+
+        if skills_summary is None:
+            skills_summary = format_skills_summary(current_skills)
+
+        preferences_text = ""
+        if learning_preferences:
+            preferences_text = _PREFERENCES_TEMPLATE % (
+                learning_preferences.get('learning_style', 'mixed'),
+                learning_preferences.get('time_commitment_hours_per_week', 10)
+            )
 
-        start_time = datetime.utcnow()
+        return _ROADMAP_PROMPT_INPUT % (career_goal, skills_summary, preferences_text)
 
+    def _build_roadmap_prompt(
+        self,
+        career_goal: str,
+        current_skills: List[Dict[str, Any]],
+        learning_preferences: Optional[Dict[str, Any]] = None,
+        skills_summary: Optional[str] = None
+    ) -> str:
+        """Build a detailed prompt for roadmap generation."""
+        return _ROADMAP_PROMPT_PREFIX + self._build_roadmap_input(
+            career_goal, current_skills, learning_preferences, skills_summary
+        )
+
+    async def _generate_roadmap_data(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Ask Gemini for the roadmap content of each request; several requests share one call."""
+        if len(requests) == 1:
+            request = requests[0]
+            prompt = self._build_roadmap_prompt(
+                request["career_goal"],
+                request["current_skills"],
+                request.get("learning_preferences"),
+                request.get("skills_summary")
+            )
+            response_text = await self._generate_text(
+                prompt, generation_config={"response_schema": ROADMAP_SCHEMA}
+            )
+            return [self._parse_model_response(response_text)]
+
+        prompt = _ROADMAP_PROMPT_PREFIX + _BATCH_PROMPT_INSTRUCTIONS % len(requests) + "".join(
+            _BATCH_INPUT_HEADER % (i + 1) + self._build_roadmap_input(
+                request["career_goal"],
+                request["current_skills"],
+                request.get("learning_preferences"),
+                request.get("skills_summary")
+            )
+            for i, request in enumerate(requests)
+        )
+        response_text = await self._generate_text(
+            prompt, generation_config={"response_schema": ROADMAP_BATCH_SCHEMA}
+        )
+        roadmaps = self._parse_model_response(response_text)
+        if not isinstance(roadmaps, list) or len(roadmaps) != len(requests):
+            raise ValueError(
+                f"Expected a JSON array of {len(requests)} roadmaps from model: {response_text[:500]}"
+            )
+        return roadmaps
+
+    @staticmethod
+    def _assemble_roadmap(request: Dict[str, Any], data: Dict[str, Any], now_iso: str) -> Dict[str, Any]:
+        """Add server-set fields to the model's roadmap content and validate the result against Roadmap."""
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a roadmap object from model, got {type(data).__name__}")
+        career_goal = request["career_goal"]
+        roadmap = {
+            "id": uuid.uuid4().hex,
+            "user_id": request.get("user_id", "anonymous"),
+            "title": data.get("title", f"Roadmap to {career_goal}"),
+            "career_goal": career_goal,
+            "estimated_weeks": data.get("estimated_weeks", 12),
+            "modules": data.get("modules", []),
+            "current_module": 0,
+            "progress_percentage": 0.0,
+            "created_at": now_iso,
+            "updated_at": now_iso
+        }
         try:
-            # Build prompt
-            prompt = self._build_roadmap_prompt(career_goal, current_skills, learning_preferences)
-
-            # Generate with Gemini
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-
-            # Clean response (remove markdown code blocks if present)
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            # Parse JSON
-            roadmap_data = json.loads(response_text)
-
-            # Add metadata
-            roadmap_id = str(uuid.uuid4())
-            roadmap = {
-                "id": roadmap_id,
-                "user_id": user_id,
-                "title": roadmap_data.get("title", f"Roadmap to {career_goal}"),
-                "career_goal": career_goal,
-                "estimated_weeks": roadmap_data.get("estimated_weeks", 12),
-                "modules": roadmap_data.get("modules", []),
-                "current_module": 0,
-                "progress_percentage": 0.0,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
+            return Roadmap.model_validate(roadmap).model_dump(mode="json")
+        except ValidationError as e:
+            raise ValueError(f"Generated roadmap is invalid: {e}") from e
 
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+    async def generate_roadmaps_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate several roadmaps, sending every request not already cached to Gemini in a single call.
+        Each request is a dict of generate_roadmap's arguments; results come back in the same order.
+        """
 
-            return {
-                "roadmap": roadmap,
-                "message": "Roadmap generated successfully",
-                "processing_time_seconds": processing_time
-            }
+        start_time = time.perf_counter()
 
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            print(f"Response text: {response_text[:500]}")
+        try:
+            # Reuse model output for equivalent earlier requests
+            cache_keys = [
+                self._response_cache_key(
+                    request["career_goal"], request["current_skills"], request.get("learning_preferences")
+                )
+                for request in requests
+            ]
+            roadmap_data = [self._get_cached_response(cache_key) for cache_key in cache_keys]
+
+            missing = [i for i, data in enumerate(roadmap_data) if data is None]
+            if missing:
+                generated = await self._generate_roadmap_data([requests[i] for i in missing])
+                for i, data in zip(missing, generated):
+                    roadmap_data[i] = data
+
+            # Add metadata and validate before anything is cached or returned
+            now_iso = datetime.now(timezone.utc).isoformat()
+            missing_set = set(missing)
+            roadmaps = []
+            for i, (request, data) in enumerate(zip(requests, roadmap_data)):
+                roadmap = self._assemble_roadmap(request, data, now_iso)
+                if i in missing_set:
+                    self._cache_response(cache_keys[i], orjson.dumps({
+                        field: roadmap[field] for field in ("title", "estimated_weeks", "modules")
+                    }).decode())
+                roadmaps.append(roadmap)
+
+            processing_time = time.perf_counter() - start_time
+            return [
+                {
+                    "roadmap": roadmap,
+                    "message": "Roadmap generated successfully",
+                    "processing_time_seconds": processing_time
+                }
+                for roadmap in roadmaps
+            ]
+
+        except ValueError as e:
+            logger.warning("Invalid roadmap response: %s", e)
             raise Exception(f"Failed to parse roadmap response: {str(e)}")
         except Exception as e:
-            print(f"Roadmap generation error: {e}")
+            logger.warning("Roadmap generation error: %s", e)
             raise Exception(f"Failed to generate roadmap: {str(e)}")
 
+    async def generate_roadmap(
+        self,
+        career_goal: str,
+        current_skills: List[Dict[str, Any]],
+        learning_preferences: Optional[Dict[str, Any]] = None,
+        user_id: str = "anonymous",
+        skills_summary: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate a personalized learning roadmap.
+        Pass skills_summary (from format_skills_summary) to reuse an already formatted skill list.
+        """
+        results = await self.generate_roadmaps_batch([{
+            "career_goal": career_goal,
+            "current_skills": current_skills,
+            "learning_preferences": learning_preferences,
+            "user_id": user_id,
+            "skills_summary": skills_summary
+        }])
+        return results[0]
+
     async def update_roadmap(
         self,
         roadmap_id: str,
@@ -168,41 +470,28 @@ IMPORTANT: Return ONLY valid JSON, no markdown formatting, no explanation text.
     ) -> Dict[str, Any]:
         """Update an existing roadmap based on user feedback."""
 
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
 
         try:
-            prompt = f"""You are Scout, an expert career path advisor.
-
-The user has the following existing roadmap:
-
-{json.dumps(existing_roadmap, indent=2)}
-
-The user wants to update it with this request:
-"{user_prompt}"
-
-Please generate an updated roadmap that incorporates the user's feedback while maintaining the same JSON structure.
-
-IMPORTANT: Return ONLY valid JSON in the exact same format as the input roadmap, no markdown, no explanation.
-"""
-
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-
-            # Clean response
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
-
-            # Parse updated roadmap
-            updated_roadmap = json.loads(response_text)
+            # Send a compact outline and ask for a patch, rather than round-tripping the full roadmap
+            prompt = _UPDATE_PROMPT_PREFIX + _UPDATE_PROMPT_INPUT % (
+                orjson.dumps(_roadmap_outline(existing_roadmap)).decode(),
+                user_prompt
+            )
+
+            response_text = await self._generate_text(prompt)
+            patch = self._parse_model_response(response_text)
+            updated_roadmap = _apply_roadmap_patch(existing_roadmap, patch)
             updated_roadmap["id"] = roadmap_id
-            updated_roadmap["updated_at"] = datetime.utcnow().isoformat()
+            updated_roadmap["updated_at"] = datetime.now(timezone.utc).isoformat()
+
+            # The patch is model output, so check the result before anyone saves it
+            try:
+                updated_roadmap = Roadmap.model_validate(updated_roadmap).model_dump(mode="json")
+            except ValidationError as e:
+                raise ValueError(f"Patched roadmap is invalid: {e}") from e
 
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
+            processing_time = time.perf_counter() - start_time
 
             return {
                 "roadmap": updated_roadmap,
@@ -211,8 +500,12 @@ IMPORTANT: Return ONLY valid JSON in the exact same format as the input roadmap,
             }
 
         except Exception as e:
-            print(f"Roadmap update error: {e}")
+            logger.warning("Roadmap update error: %s", e)
             raise Exception(f"Failed to update roadmap: {str(e)}")
 
-# Global instance
-scout_client = ScoutClient()
+# Global instance, created on first use so importing this module doesn't configure Gemini.
+# The model keeps its gRPC clients, so their channels are reused across requests.
+@cache
+def get_scout_client() -> ScoutClient:
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY", ""))
+    return ScoutClient()